@@ -0,0 +1,207 @@
+import asyncio
+from random import uniform
+from urllib.parse import urlparse
+
+import aiohttp
+import click
+
+from pSub import IDEMPOTENT_ENDPOINTS
+
+
+class AsyncPSub(object):
+    """
+    Asyncio counterpart of the pSub API for scripting many requests from one event loop.
+    Urls, authentication, retries and the circuit breaker are shared with the pSub object it wraps
+
+        async with AsyncPSub(psub, concurrency=8) as client:
+            artists = await client.get_artists()
+    """
+    def __init__(self, psub, concurrency=8):
+        """
+        :param psub: configured pSub object
+        :param concurrency: maximum number of requests in flight at once
+        """
+        self.psub = psub
+        self.concurrency = concurrency
+        self.semaphore = None
+        self.session = None
+
+    async def __aenter__(self):
+        # created here so they belong to the running event loop, not whichever loop existed at __init__
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.psub.timeout),
+            connector=aiohttp.TCPConnector(ssl=None if self.psub.verify_ssl else False)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def make_request(self, url):
+        """
+        GET the supplied url without blocking the event loop and return the response as json.
+        Behaves like pSub.make_request
+        :param url: full url. see pSub.create_url for details
+        :return: Subsonic response or None on failure
+        """
+        host = urlparse(url).netloc
+        idempotent = self.psub.get_endpoint(url) in IDEMPOTENT_ENDPOINTS
+        attempts = self.psub.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            if self.psub.circuit_open(host):
+                click.secho('{} is not responding. Try again later'.format(host), fg='red')
+                return None
+
+            try:
+                async with self.semaphore:
+                    async with self.session.get(url) as r:
+                        if r.status >= 500:
+                            r.raise_for_status()
+
+                        text = await r.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.psub.record_failure(host)
+
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(uniform(0, self.psub.backoff * 2 ** attempt))
+                    continue
+
+                click.secho('{}'.format(e) or 'Request to {} timed out'.format(host), fg='red')
+                return None
+
+            self.psub.record_success(host)
+            return self.psub.decode_response(text)
+
+    async def ping(self):
+        """
+        Ping the server
+        :return: True if the server responded
+        """
+        return await self.make_request(self.psub.create_url('ping')) is not None
+
+    async def scrobble(self, song_id):
+        """
+        notify the Subsonic server that a track is being played
+        :param song_id:
+        """
+        await self.make_request('{}&id={}'.format(self.psub.create_url('scrobble'), song_id))
+
+    async def search(self, query):
+        """
+        search using query and return the result
+        :param query: search term string
+        :return: dict
+        """
+        results = await self.make_request('{}&query={}'.format(self.psub.create_url('search3'), query))
+        if results:
+            return results['subsonic-response'].get('searchResult3', {})
+        return {}
+
+    async def get_artists(self):
+        """
+        Gather list of Artists from the Subsonic server
+        :return: list
+        """
+        artists = await self.make_request(self.psub.create_url('getArtists'))
+        if artists:
+            return artists['subsonic-response']['artists'].get('index', [])
+        return []
+
+    async def get_playlists(self):
+        """
+        Get a list of available playlists from the server
+        :return: list
+        """
+        playlists = await self.make_request(self.psub.create_url('getPlaylists'))
+        if playlists:
+            return playlists['subsonic-response']['playlists'].get('playlist', [])
+        return []
+
+    async def get_music_folders(self):
+        """
+        Gather list of Music Folders from the Subsonic server
+        :return: list
+        """
+        music_folders = await self.make_request(self.psub.create_url('getMusicFolders'))
+        if music_folders:
+            return music_folders['subsonic-response']['musicFolders'].get('musicFolder', [])
+        return []
+
+    async def get_artist(self, artist_id):
+        """
+        return the details of an artist, including their albums
+        :param artist_id: id of the artist
+        :return: dict
+        """
+        artist_info = await self.make_request('{}&id={}'.format(self.psub.create_url('getArtist'), artist_id))
+        if artist_info:
+            return artist_info['subsonic-response']['artist']
+        return {}
+
+    async def get_album_tracks(self, album_id):
+        """
+        return a list of album tracks for the given album id
+        :param album_id: id of the album
+        :return: list
+        """
+        album_info = await self.make_request('{}&id={}'.format(self.psub.create_url('getAlbum'), album_id))
+        if album_info:
+            return album_info['subsonic-response']['album'].get('song', [])
+        return []
+
+    async def get_artist_tracks(self, artist_id):
+        """
+        return a list of tracks from every album by the given artist id.
+        The albums are fetched concurrently
+        :param artist_id: id of the artist
+        :return: list
+        """
+        artist = await self.get_artist(artist_id)
+        albums = await asyncio.gather(
+            *[self.get_album_tracks(album.get('id')) for album in artist.get('album', [])]
+        )
+        return [song for album in albums for song in album]
+
+    async def get_playlist_tracks(self, playlist_id):
+        """
+        return a list of tracks in the given playlist id
+        :param playlist_id: id of the playlist
+        :return: list
+        """
+        playlist_info = await self.make_request(
+            '{}&id={}'.format(self.psub.create_url('getPlaylist'), playlist_id)
+        )
+        if playlist_info:
+            return playlist_info['subsonic-response']['playlist'].get('entry', [])
+        return []
+
+    async def get_random_songs(self, music_folder=None):
+        """
+        return a list of random tracks from the Subsonic server
+        :param music_folder: integer denoting music folder to filter tracks
+        :return: list
+        """
+        url = self.psub.create_url('getRandomSongs')
+
+        if music_folder is not None:
+            url = '{}&musicFolderId={}'.format(url, music_folder)
+
+        random_songs = await self.make_request(url)
+        if random_songs:
+            return random_songs['subsonic-response']['randomSongs'].get('song', [])
+        return []
+
+    async def get_similar_songs(self, artist_id):
+        """
+        return a list of songs similar to the given artist id
+        :param artist_id: id of the artist
+        :return: list
+        """
+        similar_songs = await self.make_request(
+            '{}&id={}'.format(self.psub.create_url('getSimilarSongs2'), artist_id)
+        )
+        if similar_songs:
+            return similar_songs['subsonic-response']['similarSongs2'].get('song', [])
+        return []
@@ -0,0 +1,214 @@
+import json
+import os
+import socket
+import socketserver
+from collections import deque
+from random import shuffle
+from threading import Condition, Thread
+
+import click
+
+
+def socket_path():
+    """
+    return the path of the Unix socket the daemon listens on
+    """
+    return os.path.join(click.get_app_dir('pSub'), 'pSub.sock')
+
+
+def send_command(request):
+    """
+    Send a single command to a running daemon and return its reply
+    :param request: dict describing the command. see Daemon.handle_command
+    :return: dict
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path())
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline() or '{}')
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Read newline separated json commands from a client and write a json reply to each
+    """
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = {}
+
+            # always answer, even if the command fails part way through
+            try:
+                response = self.server.daemon.handle_command(request)
+            except Exception as e:
+                message = '{}: {}'.format(e.__class__.__name__, e)
+                click.secho('{} failed. {}'.format(request.get('command'), message), fg='red')
+                response = {'status': 'failed', 'message': message}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+            # reply before shutting down so the client knows the command worked.
+            # shutdown blocks until serve_forever returns so can't be called from this thread
+            if request.get('command') == 'shutdown':
+                Thread(target=self.server.shutdown).start()
+
+
+class Daemon(object):
+    """
+    Keep a pSub object running and play from a queue of tracks controlled over a Unix socket
+    """
+    def __init__(self, psub):
+        self.psub = psub
+        self.queue = deque()
+        self.current = None
+        self.condition = Condition()
+        self.server = None
+
+    def serve(self):
+        """
+        Start the playback thread and listen for commands until shutdown
+        """
+        path = socket_path()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except FileNotFoundError:
+                pass
+            except ConnectionRefusedError:
+                # a socket left behind by a daemon that didn't exit cleanly stops us binding
+                os.remove(path)
+            else:
+                click.secho('pSub daemon is already running', fg='red')
+                return
+
+        self.server = socketserver.ThreadingUnixStreamServer(path, CommandHandler)
+        self.server.daemon_threads = True
+        self.server.daemon = self
+        socket_inode = os.stat(path).st_ino
+
+        player_thread = Thread(target=self.play_queue)
+        player_thread.daemon = True
+        player_thread.start()
+
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+
+            # only remove the socket if it is still ours
+            try:
+                if os.stat(path).st_ino == socket_inode:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            # don't leave ffplay running once the daemon has gone
+            self.stop()
+
+            with self.condition:
+                self.condition.wait_for(lambda: self.current is None, timeout=5)
+
+    def play_queue(self):
+        """
+        This method runs in a separate thread (started in serve).
+        Play tracks from the queue as they become available
+        """
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.current = None
+                    self.condition.notify_all()
+                    self.condition.wait()
+
+                # ignore any command meant for the previous track.
+                # this happens under the lock so a skip sent by 'play' for the new track can't be lost
+                self.psub.input_queue.queue.clear()
+                self.current = self.queue.popleft()
+
+            if not self.psub.play_stream(dict(self.current)):
+                with self.condition:
+                    self.queue.clear()
+
+    def resolve(self, kind, search_term, randomise):
+        """
+        Find the tracks to play for a command
+        :param kind: one of artist, album, playlist or random
+        :param search_term: used to find the artist, album or playlist
+        :param randomise: if True, randomise the playback order
+        :return: list of tracks
+        """
+        if kind == 'random':
+            return self.psub.get_random_songs()
+
+        _, songs = self.psub.resolve_spec(kind, search_term or '')
+
+        if self.psub.invert_random:
+            randomise = not randomise
+
+        if randomise:
+            shuffle(songs)
+
+        return songs
+
+    def stop(self):
+        """
+        Clear the queue and stop the current track
+        """
+        with self.condition:
+            self.queue.clear()
+
+            if self.current is not None:
+                self.psub.input_queue.put('x')
+
+    def handle_command(self, request):
+        """
+        Carry out a command sent by a client
+        :param request: dict with a 'command' and, for play and enqueue, 'kind', 'search_term' and 'randomise'
+        :return: dict reply for the client
+        """
+        command = request.get('command')
+
+        if command in ['play', 'enqueue']:
+            songs = self.resolve(request.get('kind'), request.get('search_term'), request.get('randomise'))
+
+            if not songs:
+                return {'status': 'failed', 'message': 'Nothing found to play'}
+
+            with self.condition:
+                if command == 'play':
+                    self.queue.clear()
+
+                    if self.current is not None:
+                        self.psub.input_queue.put('n')
+
+                self.queue.extend(songs)
+                self.condition.notify()
+
+            return {'status': 'ok', 'message': 'Queued {} tracks'.format(len(songs))}
+
+        if command in ['next', 'restart']:
+            if self.current is None:
+                return {'status': 'failed', 'message': 'Nothing is playing'}
+
+            self.psub.input_queue.put('n' if command == 'next' else 'b')
+            return {'status': 'ok'}
+
+        if command == 'stop':
+            self.stop()
+            return {'status': 'ok'}
+
+        if command == 'status':
+            with self.condition:
+                return {'status': 'ok', 'playing': self.current, 'queued': len(self.queue)}
+
+        if command == 'shutdown':
+            return {'status': 'ok', 'message': 'Shutting down'}
+
+        return {'status': 'failed', 'message': 'Unknown command {}'.format(command)}
@@ -0,0 +1,320 @@
+"""
+End to end latency harness for pSub.
+
+Runs pSub sessions against a local fake Subsonic server with configurable latency and bandwidth.
+ffplay is replaced (through the client pre_exe setting) by this script, which records when it was
+spawned, when the first audio bytes arrived and when it exited.
+From those timestamps the harness reports p50/p95/p99 for:
+
+    time to first audio: from starting playback of the chosen album/playlist to the first audio bytes
+    track gap: from one track ending to the first audio bytes of the next
+    skip: from pressing 'n' to the first audio bytes of the next track
+
+    python harness.py --mode album --latency 0.05 --bandwidth 500000 --clients 4
+"""
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+import click
+import yaml
+
+
+class FakeSubsonicHandler(BaseHTTPRequestHandler):
+    """
+    Answer the Subsonic endpoints pSub uses, after the configured latency
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.rsplit('/', 1)[-1]
+        params = parse_qs(url.query)
+        time.sleep(self.server.latency)
+
+        if endpoint == 'download':
+            return self.send_stream()
+
+        response = {'status': 'ok'}
+        tracks = [
+            {'id': 'track-{}'.format(i), 'title': 'Track {}'.format(i), 'artist': 'Harness'}
+            for i in range(self.server.track_count)
+        ]
+
+        if endpoint == 'getAlbum':
+            response['album'] = {'id': params.get('id', [''])[0], 'song': tracks}
+        elif endpoint == 'getPlaylist':
+            response['playlist'] = {'id': params.get('id', [''])[0], 'entry': tracks}
+        elif endpoint == 'getRandomSongs':
+            response['randomSongs'] = {'song': tracks}
+
+        body = json.dumps({'subsonic-response': response}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self):
+        """
+        Send track_bytes of audio, throttled to the configured bandwidth
+        """
+        self.send_response(200)
+        self.send_header('Content-Length', str(self.server.track_bytes))
+        self.end_headers()
+
+        chunk = max(1, self.server.bandwidth // 10)
+        remaining = self.server.track_bytes
+
+        try:
+            while remaining > 0:
+                self.wfile.write(b'\0' * min(chunk, remaining))
+                remaining -= chunk
+                time.sleep(0.1)
+        except OSError:
+            # the player went away, usually because the track was skipped
+            pass
+
+
+def start_server(latency, bandwidth, track_count, track_bytes):
+    """
+    Start the fake Subsonic server in a background thread
+    :return: the server
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSubsonicHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.track_count = track_count
+    server.track_bytes = track_bytes
+
+    server_thread = Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def record_event(event, **data):
+    """
+    Append a timestamped event to the session's log
+    :param event: name of the event
+    """
+    data.update(event=event, time=time.time())
+
+    with open(os.environ['PSUB_HARNESS_LOG'], 'a') as log:
+        log.write(json.dumps(data) + '\n')
+
+
+def read_events(log_path):
+    """
+    return the events recorded in a session's log, oldest first
+    """
+    if not os.path.isfile(log_path):
+        return []
+
+    with open(log_path) as log:
+        return sorted((json.loads(line) for line in log if line.strip()), key=lambda e: e['time'])
+
+
+def stub_player(args):
+    """
+    Stand in for ffplay. Read the stream, recording when audio starts and when playback ends
+    :param args: the arguments pSub passed to ffplay
+    """
+    def terminated(signum, frame):
+        record_event('exit', pid=os.getpid(), terminated=True)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, terminated)
+    record_event('spawn', pid=os.getpid())
+
+    stream = urlopen(args[args.index('-i') + 1])
+    stream.read(4096)
+    record_event('audio', pid=os.getpid())
+
+    # "play" for the track length, reading the stream as a real player would
+    finish = time.time() + float(os.environ['PSUB_HARNESS_TRACK_SECONDS'])
+
+    while time.time() < finish:
+        if not stream.read(4096):
+            time.sleep(max(0.0, finish - time.time()))
+
+    record_event('exit', pid=os.getpid(), terminated=False)
+
+
+def wait_for_audio(log_path, count, timeout):
+    """
+    Wait until the session has started playing count tracks
+    :return: False if the wait timed out
+    """
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        if len([e for e in read_events(log_path) if e['event'] == 'audio']) >= count:
+            return True
+        time.sleep(0.05)
+
+    return False
+
+
+def run_session(options):
+    """
+    Run one pSub session in this process and return its event log.
+    Every session gets its own app dir so play.lock and session files don't collide.
+    The app dir is removed once the events have been read
+    :param options: dict of harness options
+    :return: list of events
+    """
+    app_root = tempfile.mkdtemp(prefix='psub-harness-')
+
+    try:
+        os.environ['XDG_CONFIG_HOME'] = app_root
+        os.environ['PSUB_HARNESS_LOG'] = os.path.join(app_root, 'events.log')
+        os.environ['PSUB_HARNESS_TRACK_SECONDS'] = str(options['track_seconds'])
+        os.makedirs(click.get_app_dir('pSub'))
+
+        config = os.path.join(click.get_app_dir('pSub'), 'config.yaml')
+
+        with open(config, 'w') as config_file:
+            yaml.safe_dump(
+                {
+                    'server': {'host': options['host']},
+                    'streaming': {'notify': False},
+                    'client': {'pre_exe': '{} {}'.format(sys.executable, os.path.abspath(__file__))},
+                },
+                config_file
+            )
+
+        from pSub import pSub
+        psub = pSub(config)
+
+        play = {
+            'album': lambda: psub.play_album('harness-album', False),
+            'playlist': lambda: psub.play_playlist('harness-playlist', False),
+            'random': lambda: psub.play_random_songs(None),
+        }[options['mode']]
+
+        record_event('choose')
+        player = Thread(target=play)
+        player.daemon = True
+        player.start()
+
+        for track in range(options['tracks']):
+            if not wait_for_audio(os.environ['PSUB_HARNESS_LOG'], track + 1, options['timeout']):
+                break
+
+            # skip every other track part way through, let the rest play out
+            if track % 2 == 1:
+                time.sleep(options['track_seconds'] / 2)
+                record_event('skip')
+                psub.input_queue.put('n')
+
+        psub.input_queue.put('x')
+        player.join(options['timeout'])
+        return read_events(os.environ['PSUB_HARNESS_LOG'])
+    finally:
+        shutil.rmtree(app_root, ignore_errors=True)
+
+
+def session_metrics(events):
+    """
+    Work out the latencies the user would notice from one session's events
+    :param events: list of events, oldest first
+    :return: dict of metric name to list of seconds
+    """
+    metrics = {'time to first audio': [], 'track gap': [], 'skip': []}
+    audio = [e for e in events if e['event'] == 'audio']
+    choose = next((e for e in events if e['event'] == 'choose'), None)
+
+    if choose and audio:
+        metrics['time to first audio'].append(audio[0]['time'] - choose['time'])
+
+    for event in events:
+        next_audio = next((a for a in audio if a['time'] > event['time']), None)
+
+        if next_audio is None:
+            continue
+
+        if event['event'] == 'exit' and not event.get('terminated'):
+            metrics['track gap'].append(next_audio['time'] - event['time'])
+
+        if event['event'] == 'skip':
+            metrics['skip'].append(next_audio['time'] - event['time'])
+
+    return metrics
+
+
+def percentile(samples, percent):
+    """
+    return the nearest rank percentile of the samples
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, int(round(percent / 100 * len(ordered))) - 1)]
+
+
+@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--mode', '-m', type=click.Choice(['album', 'playlist', 'random']), default='album', show_default=True)
+@click.option('--clients', '-n', type=int, default=1, show_default=True, help='Number of pSub sessions to run at once.')
+@click.option('--tracks', '-t', type=int, default=6, show_default=True, help='Tracks to play in each session.')
+@click.option('--latency', '-l', type=float, default=0.05, show_default=True, help='Seconds the server waits before each response.')
+@click.option('--bandwidth', '-b', type=int, default=1000000, show_default=True, help='Bytes per second the server streams audio at.')
+@click.option('--track_seconds', '-s', type=float, default=2.0, show_default=True, help='How long the stub player plays each track.')
+def cli(mode, clients, tracks, latency, bandwidth, track_seconds):
+    server = start_server(latency, bandwidth, max(tracks, 2), bandwidth * 10)
+    options = {
+        'host': '127.0.0.1:{}'.format(server.server_port),
+        'mode': mode,
+        'tracks': tracks,
+        'track_seconds': track_seconds,
+        'timeout': 30 + track_seconds * 2,
+    }
+
+    click.secho(
+        'Running {} {} session(s) of {} tracks. latency {}s, bandwidth {} B/s'.format(
+            clients, mode, tracks, latency, bandwidth
+        ),
+        fg='green'
+    )
+
+    with ProcessPoolExecutor(max_workers=clients) as sessions:
+        results = list(sessions.map(run_session, [options] * clients))
+
+    server.shutdown()
+    metrics = {}
+
+    for events in results:
+        for name, samples in session_metrics(events).items():
+            metrics.setdefault(name, []).extend(samples)
+
+    click.echo('')
+    click.secho('{:<22}{:>8}{:>10}{:>10}{:>10}'.format('metric', 'count', 'p50 ms', 'p95 ms', 'p99 ms'), fg='blue')
+
+    for name, samples in metrics.items():
+        if not samples:
+            click.echo('{:<22}{:>8}'.format(name, 0))
+            continue
+
+        click.echo(
+            '{:<22}{:>8}{:>10.0f}{:>10.0f}{:>10.0f}'.format(
+                name,
+                len(samples),
+                *[percentile(samples, percent) * 1000 for percent in [50, 95, 99]]
+            )
+        )
+
+
+if __name__ == '__main__':
+    # pSub runs us in place of ffplay through the pre_exe setting
+    if len(sys.argv) > 1 and sys.argv[1] == 'ffplay':
+        stub_player(sys.argv[2:])
+    else:
+        cli()
@@ -1,28 +1,112 @@
 import gi
+import click
 import requests
 import os
+from threading import Condition, Thread
 gi.require_version('Notify', '0.7')
 from gi.repository import Notify, GdkPixbuf
 
 
 class Notifications(object):
-    def __init__(self, psub):
+    def __init__(self, psub, debounce=0.5):
+        """
+        Cover art is fetched and notifications shown in a background thread so track changes aren't held up.
+        When tracks change quickly only the last one in each debounce window gets a notification
+        :param psub: pSub object
+        :param debounce: seconds to wait for another track change before notifying
+        """
         Notify.init("pSub")
         self.psub = psub
+        self.debounce = debounce
+        self.pending = None
+        self.generation = 0
+        self.condition = Condition()
+
+        worker = Thread(target=self.run)
+        worker.daemon = True
+        worker.start()
+
+    def notify(self, track_data):
+        """
+        Queue a notification for the track, replacing any that hasn't been shown yet
+        :param track_data: dict
+        """
+        with self.condition:
+            self.generation += 1
+            self.pending = track_data
+            self.condition.notify()
+
+    def superseded(self, generation):
+        return generation != self.generation
+
+    def run(self):
+        """
+        This method runs in a separate thread (started in __init__).
+        Wait for the track changes to settle then fetch the cover art and show the notification
+        """
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+
+                generation = self.generation
+
+                while self.condition.wait_for(lambda: self.superseded(generation), timeout=self.debounce):
+                    generation = self.generation
+
+                track_data, self.pending = self.pending, None
+
+            # a bad cover or a notification daemon error shouldn't stop notifications for the rest of the session
+            try:
+                if self.get_cover_art(track_data, generation):
+                    self.show_notification(track_data)
+            except Exception as e:
+                click.secho('Could not show notification: {}'.format(e), fg='red')
+
+    def get_cover_art(self, track_data, generation=None):
+        """
+        Save the cover art for the track to /tmp/art.jpg.
+        Abandoning the download for a newer track is best effort. It is checked before the request
+        and between chunks, but connecting and waiting for the headers can't be interrupted
+        :param track_data: dict
+        :param generation: stop downloading if a newer track has been queued since this one
+        :return: False if the download was abandoned for a newer track
+        """
+        cover = None
+
+        if generation is not None and self.superseded(generation):
+            return False
 
-    def get_cover_art(self, track_data):
-        cover_url = self.psub.create_url('getCoverArt')
         if track_data.get('coverArt') is not None:
-            r = requests.get(
-                '{}&id={}&size=128'.format(cover_url, track_data.get('coverArt')),
-                verify=self.psub.verify_ssl
-            )
-            cover = r.content
-        else:
+            try:
+                r = self.psub.session.get(
+                    '{}&id={}&size=128'.format(self.psub.create_url('getCoverArt'), track_data.get('coverArt')),
+                    verify=self.psub.verify_ssl,
+                    timeout=self.psub.timeout,
+                    stream=True
+                )
+                cover = b''
+
+                # Subsonic reports errors as json, often with a 200 status. use the default cover for those
+                if r.status_code != 200 or not r.headers.get('Content-Type', '').startswith('image'):
+                    r.close()
+                    cover = None
+                else:
+                    for chunk in r.iter_content(chunk_size=4096):
+                        if generation is not None and self.superseded(generation):
+                            r.close()
+                            return False
+
+                        cover += chunk
+            except requests.exceptions.RequestException:
+                cover = None
+
+        if not cover:
             c = open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'no_cover.jpg'), 'rb')
             cover = c.read()
 
         open('/tmp/art.jpg', 'wb').write(cover)
+        return generation is None or not self.superseded(generation)
 
     @staticmethod
     def show_notification(track_data):
@@ -1,17 +1,22 @@
 import hashlib
+import json
 import os
 import string
 import sys
 import time
-from random import SystemRandom, shuffle
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from random import SystemRandom, shuffle, uniform
 from subprocess import CalledProcessError, Popen
-from threading import Thread
+from threading import Event, Lock, Thread
 from typing import Dict, List, Union
+from urllib.parse import parse_qsl, urlparse
 
 import questionary
 import requests
 from click import UsageError
 from packaging import version
+from prompt_toolkit.completion import Completer, Completion, ThreadedCompleter
 
 from queue import LifoQueue
 
@@ -20,6 +25,35 @@ import yaml
 import urllib3
 urllib3.disable_warnings()
 
+# Subsonic endpoints that only read data from the server.
+# These are safe to retry or to send twice when hedging
+IDEMPOTENT_ENDPOINTS = {
+    'ping',
+    'search3',
+    'getArtists',
+    'getArtist',
+    'getAlbum',
+    'getPlaylists',
+    'getPlaylist',
+    'getMusicFolders',
+    'getRandomSongs',
+    'getAlbumList2',
+    'getSimilarSongs2',
+}
+
+# Idempotent endpoints whose results are the same for every caller.
+# Identical requests to these that are in flight at the same time share one response.
+# Random and similar songs are left out as each caller should get its own selection
+COALESCED_ENDPOINTS = IDEMPOTENT_ENDPOINTS - {'getRandomSongs', 'getSimilarSongs2'}
+
+# orders the whole library can be played in, mapped to the getAlbumList2 type
+LIBRARY_ORDERS = {
+    'alphabetical': 'alphabeticalByName',
+    'newest': 'newest',
+    'frequent': 'frequent',
+    'recent': 'recent',
+}
+
 
 class pSub(object):
     """
@@ -52,9 +86,26 @@ class pSub(object):
         self.api = server_config.get('api', '1.16.0')
         self.ssl = server_config.get('ssl', False)
         self.verify_ssl = server_config.get('verify_ssl', True)
+        self.timeout = server_config.get('timeout', 10)
+        self.retries = server_config.get('retries', 3)
+        self.backoff = server_config.get('backoff', 0.5)
+        self.breaker_threshold = server_config.get('breaker_threshold', 5)
+        self.breaker_cooldown = server_config.get('breaker_cooldown', 30)
+        self.hedge = server_config.get('hedge', False)
+
+        # connection state shared by all requests to the server
+        self.session = requests.Session()
+        self.request_lock = Lock()
+        self.host_failures = defaultdict(int)
+        self.breaker_opened = {}
+        self.breaker_trials = {}
+        self.latencies = defaultdict(lambda: deque(maxlen=100))
+        self.in_flight = {}
+        self.hedge_pool = ThreadPoolExecutor(max_workers=4) if self.hedge else None
 
         # internal variables
         self.search_results = []
+        self.session_state = None
 
         # get the streaming config
         streaming_config = config.get('streaming', {})
@@ -144,24 +195,111 @@ class pSub(object):
     def make_request(self, url):
         """
         GET the supplied url and resturn the response as json.
-        Handle any errors present.
+        If an identical request to one of the COALESCED_ENDPOINTS is already in flight,
+        wait for it and share its response rather than sending another.
         :param url: full url. see create_url method for details
         :return: Subsonic response or None on failure
         """
+        if self.get_endpoint(url) not in COALESCED_ENDPOINTS:
+            return self.send_request(url)
+
+        key = self.request_key(url)
+
+        with self.request_lock:
+            in_flight = self.in_flight.get(key)
+            leader = in_flight is None
+
+            if leader:
+                in_flight = self.in_flight[key] = Future()
+
+        if not leader:
+            # another caller is already fetching this
+            return in_flight.result()
+
         try:
-            r = requests.get(url=url, verify=self.verify_ssl)
-        except requests.exceptions.ConnectionError as e:
-            click.secho('{}'.format(e), fg='red')
-            sys.exit(1)
+            response = self.send_request(url)
+            in_flight.set_result(response)
+        except BaseException as e:
+            in_flight.set_exception(e)
+            raise
+        finally:
+            with self.request_lock:
+                del self.in_flight[key]
+
+        return response
+
+    @staticmethod
+    def request_key(url):
+        """
+        Identify a request by its host, endpoint and parameters.
+        Authentication and client parameters are left out as the salt and token change every time
+        :param url: full url
+        :return: hashable key
+        """
+        parsed = urlparse(url)
+        params = sorted(
+            (name, value) for name, value in parse_qsl(parsed.query)
+            if name not in ['u', 'p', 't', 's', 'v', 'c', 'f']
+        )
+        return parsed.netloc, pSub.get_endpoint(url), tuple(params)
+
+    def send_request(self, url):
+        """
+        GET the supplied url and return the response as json.
+        Idempotent endpoints are retried with jittered exponential backoff.
+        Hosts that keep failing are skipped until the circuit breaker cools down.
+        Handle any errors present.
+        :param url: full url. see create_url method for details
+        :return: Subsonic response or None on failure
+        """
+        host = urlparse(url).netloc
+        endpoint = self.get_endpoint(url)
+        idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+        attempts = self.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            if self.circuit_open(host):
+                click.secho('{} is not responding. Try again later'.format(host), fg='red')
+                return None
+
+            try:
+                if idempotent and self.hedge:
+                    r = self.hedged_get(url, endpoint)
+                else:
+                    r = self.timed_get(url, endpoint)
+
+                if r.status_code >= 500:
+                    r.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                self.record_failure(host)
+
+                if attempt + 1 < attempts:
+                    time.sleep(uniform(0, self.backoff * 2 ** attempt))
+                    continue
 
+                click.secho('{}'.format(e), fg='red')
+                return None
+
+            self.record_success(host)
+            break
+
+        return self.decode_response(r.text)
+
+    @staticmethod
+    def decode_response(text):
+        """
+        Decode the body of a Subsonic response, reporting any error it contains
+        :param text: body of the http response
+        :return: Subsonic response or None on failure
+        """
         try:
-            response = r.json()
+            response = json.loads(text)
         except ValueError:
             response = {
                 'subsonic-response': {
                     'error': {
                         'code': 100,
-                        'message': r.text
+                        'message': text
                     },
                     'status': 'failed'
                 }
@@ -183,6 +321,116 @@ class pSub(object):
 
         return response
 
+    @staticmethod
+    def get_endpoint(url):
+        """
+        return the REST endpoint name from a url built by create_url
+        :param url: full url
+        """
+        endpoint = urlparse(url).path.rsplit('/', 1)[-1]
+
+        if endpoint.endswith('.view'):
+            endpoint = endpoint[:-len('.view')]
+
+        return endpoint
+
+    def timed_get(self, url, endpoint):
+        """
+        GET the url, recording how long the server took to respond
+        :param url: full url
+        :param endpoint: REST endpoint the url is for
+        :return: requests Response
+        """
+        start = time.monotonic()
+        r = self.session.get(url=url, verify=self.verify_ssl, timeout=self.timeout)
+
+        with self.request_lock:
+            self.latencies[endpoint].append(time.monotonic() - start)
+
+        return r
+
+    def hedged_get(self, url, endpoint):
+        """
+        GET the url and, if it has not answered by the p95 latency for the endpoint,
+        send a duplicate request and use whichever responds first
+        :param url: full url
+        :param endpoint: REST endpoint the url is for
+        :return: requests Response
+        """
+        with self.request_lock:
+            samples = sorted(self.latencies[endpoint])
+
+        # wait for enough samples to give a meaningful p95
+        if len(samples) < 20:
+            return self.timed_get(url, endpoint)
+
+        futures = [self.hedge_pool.submit(self.timed_get, url, endpoint)]
+        done, _ = wait(futures, timeout=samples[int(len(samples) * 0.95)])
+
+        if not done:
+            futures.append(self.hedge_pool.submit(self.timed_get, url, endpoint))
+
+        error = None
+
+        for future in as_completed(futures):
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+
+        raise error
+
+    def circuit_open(self, host):
+        """
+        Check the circuit breaker for the given host.
+        Once the cooldown has passed the breaker lets a single trial request through to test the host again.
+        Everyone else keeps waiting until that request succeeds or fails.
+        A trial that never reports back (interrupted or cancelled) is replaced after another cooldown
+        :param host: host (and port) of the server
+        :return: True if requests to the host should not be attempted
+        """
+        with self.request_lock:
+            opened = self.breaker_opened.get(host)
+            now = time.monotonic()
+
+            if opened is None:
+                return False
+
+            if now - opened < self.breaker_cooldown:
+                return True
+
+            trial = self.breaker_trials.get(host)
+
+            if trial is not None and now - trial < self.breaker_cooldown:
+                return True
+
+            # half open. this caller makes the trial request
+            self.breaker_trials[host] = now
+            return False
+
+    def record_failure(self, host):
+        """
+        Count a failed request and trip the circuit breaker if the host keeps failing
+        :param host: host (and port) of the server
+        """
+        with self.request_lock:
+            self.host_failures[host] += 1
+
+            # a failed trial request opens the breaker for another cooldown
+            if host in self.breaker_trials or self.host_failures[host] >= self.breaker_threshold:
+                self.breaker_trials.pop(host, None)
+                self.breaker_opened[host] = time.monotonic()
+
+    def record_success(self, host):
+        """
+        Reset the failure count for the host after a good response and close the breaker
+        :param host: host (and port) of the server
+        """
+        with self.request_lock:
+            self.host_failures[host] = 0
+            self.breaker_trials.pop(host, None)
+            self.breaker_opened.pop(host, None)
+
     def scrobble(self, song_id):
         """
         notify the Subsonic server that a track is being played within pSub
@@ -206,8 +454,8 @@ class pSub(object):
             url='{}&query={}'.format(self.create_url('search3'), query)
         )
         if results:
-            return results['subsonic-response'].get('searchResult3', [])
-        return []
+            return results['subsonic-response'].get('searchResult3', {})
+        return {}
 
     def get_artists(self):
         """
@@ -248,34 +496,248 @@ class pSub(object):
         album_info = self.make_request('{}&id={}'.format(self.create_url('getAlbum'), album_id))
         songs = []
 
+        if not album_info:
+            return songs
+
         for song in album_info['subsonic-response']['album'].get('song', []):
             songs.append(song)
 
         return songs
 
-    def play_random_songs(self, music_folder):
+    def get_random_songs(self, music_folder=None):
         """
-        Gather random tracks from the Subsonic server and play them endlessly
+        return a list of random tracks from the Subsonic server
         :param music_folder: integer denoting music folder to filter tracks
+        :return: list
         """
         url = self.create_url('getRandomSongs')
-        
+
         if music_folder is not None:
             url = '{}&musicFolderId={}'.format(url, music_folder)
 
+        random_songs = self.make_request(url)
+
+        if random_songs:
+            return list(random_songs['subsonic-response']['randomSongs'].get('song', []))
+        return []
+
+    def get_album_list(self, list_type, size, offset, music_folder=None):
+        """
+        return one page of albums from the whole library
+        :param list_type: getAlbumList2 type. see LIBRARY_ORDERS
+        :param size: number of albums in the page
+        :param offset: index of the first album in the page
+        :param music_folder: integer denoting music folder to filter albums
+        :return: list
+        """
+        url = '{}&type={}&size={}&offset={}'.format(self.create_url('getAlbumList2'), list_type, size, offset)
+
+        if music_folder is not None:
+            url = '{}&musicFolderId={}'.format(url, music_folder)
+
+        album_list = self.make_request(url)
+
+        if album_list:
+            return album_list['subsonic-response']['albumList2'].get('album', [])
+        return []
+
+    def iter_library_albums(self, list_type, music_folder=None, page_size=50):
+        """
+        Generate every album in the library, fetching a page at a time
+        :param list_type: getAlbumList2 type. see LIBRARY_ORDERS
+        :param music_folder: integer denoting music folder to filter albums
+        :param page_size: number of albums to fetch per request
+        """
+        offset = 0
+
+        while True:
+            albums = self.get_album_list(list_type, page_size, offset, music_folder)
+            yield from albums
+
+            if len(albums) < page_size:
+                return
+
+            offset += page_size
+
+    def iter_library_tracks(self, list_type, music_folder=None):
+        """
+        Generate every track in the library, album by album.
+        The tracks of the next album are fetched in the background while the current album plays
+        so only two albums are held in memory at once
+        :param list_type: getAlbumList2 type. see LIBRARY_ORDERS
+        :param music_folder: integer denoting music folder to filter albums
+        """
+        albums = self.iter_library_albums(list_type, music_folder)
+
+        def next_album_tracks():
+            album = next(albums, None)
+            return None if album is None else self.get_album_tracks(album.get('id'))
+
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            upcoming = prefetch.submit(next_album_tracks)
+
+            while True:
+                songs = upcoming.result()
+
+                if songs is None:
+                    return
+
+                upcoming = prefetch.submit(next_album_tracks)
+                yield from songs
+
+    def get_artist_tracks(self, artist_id, cancelled=None):
+        """
+        return a list of tracks from every album by the given artist id
+        :param artist_id: id of the artist
+        :param cancelled: optional threading.Event. once set, no more albums are fetched
+        :return: list
+        """
+        artist_info = self.make_request('{}&id={}'.format(self.create_url('getArtist'), artist_id))
+        songs = []
+
+        if not artist_info:
+            return songs
+
+        # artists with no albums have no album key at all
+        for album in artist_info['subsonic-response']['artist'].get('album', []):
+            if cancelled is not None and cancelled.is_set():
+                break
+
+            songs += self.get_album_tracks(album.get('id'))
+
+        return songs
+
+    def get_playlist_tracks(self, playlist_id):
+        """
+        return a list of tracks in the given playlist id
+        :param playlist_id: id of the playlist
+        :return: list
+        """
+        playlist_info = self.make_request(
+            url='{}&id={}'.format(self.create_url('getPlaylist'), playlist_id)
+        )
+
+        if playlist_info:
+            # copy the list as responses can be shared and the caller may shuffle it
+            return list(playlist_info['subsonic-response']['playlist'].get('entry', []))
+        return []
+
+    def play_random_songs(self, music_folder):
+        """
+        Gather random tracks from the Subsonic server and play them endlessly
+        :param music_folder: integer denoting music folder to filter tracks
+        """
         playing = True
 
         while playing:
-            random_songs = self.make_request(url)
+            random_songs = self.get_random_songs(music_folder)
 
             if not random_songs:
                 return
 
-            for random_song in random_songs['subsonic-response']['randomSongs'].get('song', []):
+            for random_song in random_songs:
                 if not playing:
                     return
                 playing = self.play_stream(dict(random_song))
 
+    @staticmethod
+    def best_match(items, term):
+        """
+        Choose the item whose name best matches term.
+        An exact match wins, then a name starting with term, then a name containing it
+        :param items: list of artists, albums or playlists
+        :param term: search term
+        :return: the matching item or None
+        """
+        term = term.lower()
+        rules = [
+            lambda name: name == term,
+            lambda name: name.startswith(term),
+            lambda name: term in name,
+        ]
+
+        for rule in rules:
+            match = next((item for item in items if rule(item.get('name', '').lower())), None)
+
+            if match is not None:
+                return match
+
+        return None
+
+    def resolve_spec(self, kind, term, cancelled=None):
+        """
+        Find the artist, album or playlist best matching term, without asking the user, and its tracks
+        :param kind: 'artist', 'album' or 'playlist'
+        :param term: search term
+        :param cancelled: optional threading.Event. once set, an artist's remaining albums aren't fetched
+        :return: tuple of the matched item (or None) and its tracks
+        """
+        if kind == 'playlist':
+            match = self.best_match(get_as_list(self.get_playlists()), term)
+        else:
+            results = get_as_list(self.search(term).get(kind, []))
+            # the server has already decided these match so fall back to its first choice
+            match = self.best_match(results, term) or next(iter(results), None)
+
+        if match is None:
+            return None, []
+
+        if kind == 'artist':
+            tracks = self.get_artist_tracks(match.get('id'), cancelled)
+        elif kind == 'album':
+            tracks = self.get_album_tracks(match.get('id'))
+        else:
+            tracks = self.get_playlist_tracks(match.get('id'))
+
+        return match, tracks
+
+    def play_batch(self, specs):
+        """
+        Resolve many artists, albums and playlists at once and play them in the order given.
+        Playback starts as soon as the first one is ready
+        :param specs: list of (kind, search term) tuples
+        """
+        resolver = ThreadPoolExecutor(max_workers=8)
+        cancelled = Event()
+        futures = [resolver.submit(self.resolve_spec, kind, term, cancelled) for kind, term in specs]
+
+        try:
+            for (kind, term), future in zip(specs, futures):
+                # one bad item shouldn't stop the rest of an unattended batch
+                try:
+                    match, songs = future.result()
+                except Exception as e:
+                    click.secho('Could not find {} "{}": {}: {}'.format(kind, term, e.__class__.__name__, e), fg='red')
+                    continue
+
+                if match is None:
+                    click.secho('No {} found matching "{}"'.format(kind, term), fg='red')
+                    continue
+
+                click.secho('Playing {} "{}"'.format(kind, match.get('name')), fg='blue')
+
+                for song in songs:
+                    if not self.play_stream(dict(song)):
+                        return
+        finally:
+            # when playback stops early don't wait for the rest of the queue to be resolved
+            cancelled.set()
+
+            for pending in futures:
+                pending.cancel()
+
+            resolver.shutdown(wait=False)
+
+    def play_library(self, order, music_folder):
+        """
+        Play every album in the library in the given order
+        :param order: one of the keys of LIBRARY_ORDERS
+        :param music_folder: integer denoting music folder to filter albums
+        """
+        for song in self.iter_library_tracks(LIBRARY_ORDERS[order], music_folder):
+            if not self.play_stream(dict(song)):
+                return
+
     def play_radio(self, radio_id):
         """
         Get songs similar to the supplied id and play them endlessly
@@ -301,11 +763,7 @@ class pSub(object):
         :param artist_id:  id of the artist to play
         :param randomise: if True, randomise the playback order
         """
-        artist_info = self.make_request('{}&id={}'.format(self.create_url('getArtist'), artist_id))
-        songs = []
-
-        for album in artist_info['subsonic-response']['artist']['album']:
-            songs += self.get_album_tracks(album.get('id'))
+        songs = self.get_artist_tracks(artist_id)
 
         if self.invert_random:
             randomise = not randomise
@@ -313,13 +771,7 @@ class pSub(object):
         if randomise:
             shuffle(songs)
 
-        playing = True
-
-        while playing:
-            for song in songs:
-                if not playing:
-                    return
-                playing = self.play_stream(dict(song))
+        self.play_tracks(songs)
 
     def play_album(self, album_id, randomise):
         """
@@ -336,13 +788,7 @@ class pSub(object):
         if randomise:
             shuffle(songs)
 
-        playing = True
-
-        while playing:
-            for song in songs:
-                if not playing:
-                    return
-                playing = self.play_stream(dict(song))
+        self.play_tracks(songs)
 
     def play_playlist(self, playlist_id, randomise):
         """
@@ -351,10 +797,7 @@ class pSub(object):
         :param randomise:
         :return:
         """
-        playlist_info = self.make_request(
-            url='{}&id={}'.format(self.create_url('getPlaylist'), playlist_id)
-        )
-        songs = playlist_info['subsonic-response']['playlist']['entry']
+        songs = self.get_playlist_tracks(playlist_id)
 
         if self.invert_random:
             randomise = not randomise
@@ -362,30 +805,97 @@ class pSub(object):
         if randomise:
             shuffle(songs)
 
+        self.play_tracks(songs)
+
+    def play_tracks(self, songs, position=0, offset=0):
+        """
+        Play the songs in order, repeating them endlessly.
+        The queue and playback position are saved as they change so playback can be resumed later
+        :param songs: list of tracks in the order they should play
+        :param position: index of the track to start with
+        :param offset: number of seconds into the first track to start from
+        """
+        if not songs:
+            return
+
+        # only keep what play_stream needs so the session file stays small
+        self.session_state = {
+            'tracks': [
+                {key: song.get(key) for key in ['id', 'title', 'artist', 'coverArt']} for song in songs
+            ],
+            'position': position,
+            'elapsed': offset,
+        }
+
         playing = True
 
         while playing:
-            for song in songs:
+            for index in range(position, len(songs)):
+                self.session_state.update(position=index, elapsed=offset)
+                self.save_session()
+
+                playing = self.play_stream(dict(songs[index]), offset)
+                offset = 0
+
                 if not playing:
-                    return
-                playing = self.play_stream(dict(song))
+                    break
+
+            position = 0
+
+        self.session_state = None
+
+    def save_session(self):
+        """
+        Write the current session state to the session file.
+        The file is replaced in one step so a crash never leaves it half written
+        """
+        if self.session_state is None:
+            return
+
+        session_file = os.path.join(click.get_app_dir('pSub'), 'session.json')
 
-    def play_stream(self, track_data):
+        with open('{}.tmp'.format(session_file), 'w') as tmp_file:
+            json.dump(self.session_state, tmp_file)
+
+        os.replace('{}.tmp'.format(session_file), session_file)
+
+    def resume(self):
+        """
+        Carry on playing the queue saved by the last play_tracks session
+        :return: False if there is no session to resume
+        """
+        session_file = os.path.join(click.get_app_dir('pSub'), 'session.json')
+
+        try:
+            with open(session_file) as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return False
+
+        if not state.get('tracks'):
+            return False
+
+        self.play_tracks(state.get('tracks', []), state.get('position', 0), state.get('elapsed', 0))
+        return True
+
+    def play_stream(self, track_data, offset=0):
         """
         Given track data, generate the stream url and pass it to ffplay to handle.
         While stream is playing allow user input to control playback
         :param track_data: dict
+        :param offset: number of seconds into the track to start playing from
         :return:
         """
         stream_url = self.create_url('download')
         song_id = track_data.get('id')
 
-        if self.notify:
-            self.notifications.get_cover_art(track_data)
-
         if not song_id:
             return False
 
+        # cover art and the notification are handled in the background so skipping stays instant
+        if self.notify:
+            self.notifications.notify(track_data)
+
         click.secho(
             '{} by {}'.format(
                 track_data.get('title', ''),
@@ -423,17 +933,27 @@ class pSub(object):
         if not self.display:
             params += ['-nodisp']
 
-        try:
-            if self.notify:
-                self.notifications.show_notification(track_data)
+        if offset:
+            params += ['-ss', '{}'.format(offset)]
 
+        try:
             ffplay = Popen(params)
 
             has_finished = None
             open(os.path.join(click.get_app_dir('pSub'), 'play.lock'), 'w+').close()
+            started = time.monotonic() - offset
+
+            if self.session_state is not None:
+                self.session_state['elapsed'] = offset
 
             while has_finished is None:
                 has_finished = ffplay.poll()
+
+                # keep the saved position roughly up to date in case pSub doesn't exit cleanly
+                if self.session_state is not None and time.monotonic() - started >= self.session_state['elapsed'] + 5:
+                    self.session_state['elapsed'] = int(time.monotonic() - started)
+                    self.save_session()
+
                 if self.input_queue.empty():
                     time.sleep(1)
                     continue
@@ -482,6 +1002,10 @@ class pSub(object):
         When the play.lock file exists it waits for user input and wrties it to a Queue.
         The play_stream method above deals with the user input when it occurs
         """
+        # there is nobody to type commands when running detached from a terminal
+        if not sys.stdin.isatty():
+            return
+
         while True:
             if not os.path.isfile(os.path.join(click.get_app_dir('pSub'), 'play.lock')):
                 continue
@@ -540,6 +1064,28 @@ server:
     
     api: 1.16.0
 
+    # Number of seconds to wait for the server to respond before giving up on a request
+
+    timeout: 10
+
+    # Requests that only read from the server are retried this many times if they fail.
+    # The wait between retries doubles each time, starting from a random delay of up to 'backoff' seconds
+
+    retries: 3
+    backoff: 0.5
+
+    # After 'breaker_threshold' failed requests in a row pSub stops contacting the server
+    # for 'breaker_cooldown' seconds rather than waiting on every request
+
+    breaker_threshold: 5
+    breaker_cooldown: 30
+
+    # Set this to true to send a second copy of a slow request once it has taken longer
+    # than 95% of previous requests, using whichever response arrives first.
+    # This smooths out occasional slow responses at the cost of some extra load on the server
+
+    hedge: false
+
 # This section defines the playback of music by pSub
 
 streaming:
@@ -588,6 +1134,106 @@ client:
             )
 
 
+class SearchCompleter(Completer):
+    """
+    Complete artist or album names by searching the Subsonic server as the user types.
+    Keystrokes are debounced, searches overtaken by further typing are dropped
+    and results for earlier prefixes are filtered locally where they are known to be complete
+    """
+    # Subsonic returns at most this many artists or albums when no count is given
+    search_count = 20
+
+    def __init__(self, psub, kind, debounce=0.3):
+        """
+        :param psub: pSub object
+        :param kind: 'artist' or 'album'
+        :param debounce: seconds to wait for typing to pause before searching
+        """
+        self.psub = psub
+        self.kind = kind
+        self.debounce = debounce
+        self.generation = 0
+        self.lock = Lock()
+        self.cache = {}
+        self.results = []
+
+    def search(self, query):
+        """
+        return the results for query, reusing the results of an earlier search where possible
+        :param query: lower case search term
+        :return: list of artists or albums
+        """
+        if query in self.cache:
+            return self.cache[query]
+
+        # a single word search returning fewer than the maximum holds everything matching a longer word too.
+        # the server matches several words in any order and expands wildcards, so leave those to it
+        if not self.is_plain_word(query):
+            prefixes = []
+        else:
+            prefixes = sorted((prefix for prefix in self.cache if self.is_plain_word(prefix)), key=len, reverse=True)
+
+        for prefix in prefixes:
+            if query.startswith(prefix) and len(self.cache[prefix]) < self.search_count:
+                return [item for item in self.cache[prefix] if query in self.searched_text(item)]
+
+        results = get_as_list(self.psub.search(query).get(self.kind, []))
+        self.cache[query] = results
+        return results
+
+    @staticmethod
+    def is_plain_word(query):
+        return not any(character.isspace() or character == '*' for character in query)
+
+    def searched_text(self, item):
+        """
+        return the lower case text the server searches for an item. Albums also match on their artist
+        """
+        fields = ['name', 'artist'] if self.kind == 'album' else ['name']
+        return ' '.join(item.get(field) or '' for field in fields).lower()
+
+    def get_completions(self, document, complete_event):
+        query = document.text.strip().lower()
+
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+
+        if not query:
+            return
+
+        time.sleep(self.debounce)
+
+        # the user has carried on typing so this search is no longer wanted
+        if generation != self.generation:
+            return
+
+        results = self.search(query)
+
+        if generation != self.generation:
+            return
+
+        self.results = results
+
+        for item in results:
+            yield Completion(
+                item.get('name', ''),
+                start_position=-len(document.text),
+                display_meta=item.get('artist', '') if self.kind == 'album' else ''
+            )
+
+    def find(self, name):
+        """
+        return the artist or album the user chose, ignoring case if there is no exact match
+        :param name: name entered in the picker
+        :return: the artist or album, or None if it isn't in the latest results
+        """
+        return next(
+            (item for item in self.results if item.get('name') == name),
+            next((item for item in self.results if item.get('name', '').lower() == name.strip().lower()), None)
+        )
+
+
 # _________ .____    .___
 # \_   ___ \|    |   |   |
 # /    \  \/|    |   |   |
@@ -632,6 +1278,10 @@ def cli(ctx, config, test):
             click.secho('please open {} manually to edit your config file'.format(config_file), fg='yellow')
             return
 
+    # the daemon client talks to an already running pSub so needs no setup of its own
+    if ctx.invoked_subcommand == 'ctl':
+        return
+
     ctx.obj = pSub(config_file)
 
     if test:
@@ -669,18 +1319,101 @@ def random(psub, music_folder):
     psub.play_random_songs(music_folder)
 
 
+@cli.command(help='Play many artists, albums and playlists without prompting. e.g. artist:Bowie album:"Abbey Road"')
+@click.argument('specs', nargs=-1)
+@click.option(
+    '--file',
+    '-f',
+    'spec_file',
+    type=click.File('r'),
+    help='Read specs from a file, one per line. Use - to read from stdin.',
+)
+@pass_pSub
+def batch(psub, specs, spec_file):
+    specs = list(specs) + ([line.strip() for line in spec_file if line.strip()] if spec_file else [])
+    parsed = []
+
+    for spec in specs:
+        kind, _, term = spec.partition(':')
+
+        if kind not in ['artist', 'album', 'playlist'] or not term.strip():
+            raise UsageError('"{}" should look like artist:<search term>, album:<search term> or playlist:<name>'.format(spec))
+
+        parsed.append((kind, term.strip()))
+
+    if not parsed:
+        raise UsageError('Nothing to play. Pass some specs or a file of them')
+
+    psub.show_banner('Playing {} queued items'.format(len(parsed)))
+    psub.play_batch(parsed)
+
+
+@cli.command(help='Play every album in the library')
+@click.option(
+    '--order',
+    '-o',
+    type=click.Choice(list(LIBRARY_ORDERS)),
+    default='alphabetical',
+    show_default=True,
+    help='The order to play albums in.',
+)
+@click.option(
+    '--music_folder',
+    '-f',
+    type=int,
+    help='Specify the music folder to play albums from.',
+)
+@pass_pSub
+def library(psub, order, music_folder):
+    psub.show_banner('Playing the library, {} albums first'.format(order))
+    psub.play_library(order, music_folder)
+
+
+@cli.command(help='Resume the last album, artist or playlist from where it stopped')
+@pass_pSub
+def resume(psub):
+    psub.show_banner('Resuming playback')
+
+    if not psub.resume():
+        click.secho('Nothing to resume', fg='red')
+
+
 def get_as_list(list_inst: Union[List, Dict]) -> List[Dict]:
     if isinstance(list_inst,dict):
         list_inst = [list_inst]
     return list_inst
 
 
+def pick_search_result(psub, kind, message):
+    """
+    Let the user find an artist or album with a search-as-you-type picker
+    :param psub: pSub object
+    :param kind: 'artist' or 'album'
+    :param message: prompt shown to the user
+    :return: the chosen artist or album, or None
+    """
+    completer = SearchCompleter(psub, kind)
+
+    while True:
+        name = questionary.autocomplete(message, choices=[], completer=ThreadedCompleter(completer)).ask()
+
+        # nothing entered or the picker was cancelled
+        if not name:
+            return None
+
+        chosen = completer.find(name)
+
+        if chosen is not None:
+            return chosen
+
+        click.secho('No match for "{}". Choose one of the suggestions'.format(name), fg='red')
+
+
 @cli.command(help='Play endless Radio based on a search')
-@click.argument('search_term')
+@click.argument('search_term', required=False)
 @pass_pSub
-@click.pass_context
-def radio(ctx, psub, search_term):
-    results = get_as_list(psub.search(search_term).get('artist', []))
+def radio(psub, search_term):
+    results = get_as_list(psub.search(search_term).get('artist', [])) if search_term else []
 
     if len(results) > 0:
         chosen_artist = questionary.select(
@@ -688,28 +1421,24 @@ def radio(ctx, psub, search_term):
             choices=[artist.get('name') for artist in results] + ['Search Again']
         ).ask()
     else:
-        click.secho('No Artists found matching {}'.format(search_term), fg='red', color=True)
+        if search_term:
+            click.secho('No Artists found matching {}'.format(search_term), fg='red', color=True)
         chosen_artist = 'Search Again'
 
     if chosen_artist == 'Search Again':
-        search_term = questionary.text("Enter a new search term").ask()
-
-        if not search_term:
-            sys.exit(0)
-
-        ctx.invoke(radio, search_term=search_term)
+        radio_artist = pick_search_result(psub, 'artist', 'Start typing to search for an Artist')
     else:
         radio_artist = next((art for art in results if art.get('name') == chosen_artist), None)
 
-        if radio_artist is None:
-            sys.exit(0)
+    if radio_artist is None:
+        sys.exit(0)
 
-        psub.show_banner('Playing Radio based on {}'.format(radio_artist.get('name')))
-        psub.play_radio(radio_artist.get('id'))
+    psub.show_banner('Playing Radio based on {}'.format(radio_artist.get('name')))
+    psub.play_radio(radio_artist.get('id'))
 
 
 @cli.command(help='Play songs from chosen Artist')
-@click.argument('search_term')
+@click.argument('search_term', required=False)
 @click.option(
     '--randomise',
     '-r',
@@ -717,9 +1446,8 @@ def radio(ctx, psub, search_term):
     help='Randomise the order of track playback',
 )
 @pass_pSub
-@click.pass_context
-def artist(ctx, psub, search_term, randomise):
-    results = get_as_list(psub.search(search_term).get('artist', []))
+def artist(psub, search_term, randomise):
+    results = get_as_list(psub.search(search_term).get('artist', [])) if search_term else []
 
     if len(results) > 0:
         chosen_artist = questionary.select(
@@ -727,33 +1455,29 @@ def artist(ctx, psub, search_term, randomise):
             choices=[artist.get('name') for artist in results] + ['Search Again']
         ).ask()
     else:
-        click.secho('No artists found matching "{}"'.format(search_term), fg='red', color=True)
+        if search_term:
+            click.secho('No artists found matching "{}"'.format(search_term), fg='red', color=True)
         chosen_artist = 'Search Again'
 
     if chosen_artist == 'Search Again':
-        search_term = questionary.text("Enter a new search term").ask()
-
-        if not search_term:
-            sys.exit(0)
-
-        ctx.invoke(artist, search_term=search_term, randomise=randomise)
+        play_artist = pick_search_result(psub, 'artist', 'Start typing to search for an Artist')
     else:
         play_artist = next((art for art in results if art.get('name') == chosen_artist), None)
 
-        if play_artist is None:
-            sys.exit(0)
+    if play_artist is None:
+        sys.exit(0)
 
-        psub.show_banner(
-            'Playing {}tracks by {}'.format(
-                'randomised ' if randomise else '',
-                play_artist.get('name')
-            )
+    psub.show_banner(
+        'Playing {}tracks by {}'.format(
+            'randomised ' if randomise else '',
+            play_artist.get('name')
         )
-        psub.play_artist(play_artist.get('id'), randomise)
+    )
+    psub.play_artist(play_artist.get('id'), randomise)
 
 
 @cli.command(help='Play songs from chosen Album')
-@click.argument('search_term')
+@click.argument('search_term', required=False)
 @click.option(
     '--randomise',
     '-r',
@@ -761,9 +1485,8 @@ def artist(ctx, psub, search_term, randomise):
     help='Randomise the order of track playback',
 )
 @pass_pSub
-@click.pass_context
-def album(ctx, psub, search_term, randomise):
-    results = get_as_list(psub.search(search_term).get('album', []))
+def album(psub, search_term, randomise):
+    results = get_as_list(psub.search(search_term).get('album', [])) if search_term else []
 
     if len(results) > 0:
         chosen_album = questionary.select(
@@ -771,29 +1494,25 @@ def album(ctx, psub, search_term, randomise):
             choices=[album.get('name') for album in results] + ['Search Again']
         ).ask()
     else:
-        click.secho('No albums found matching "{}"'.format(search_term), fg='red', color=True)
+        if search_term:
+            click.secho('No albums found matching "{}"'.format(search_term), fg='red', color=True)
         chosen_album = 'Search Again'
 
     if chosen_album == 'Search Again':
-        search_term = questionary.text("Enter a new search term").ask()
-
-        if not search_term:
-            sys.exit(0)
-
-        ctx.invoke(album, search_term=search_term, randomise=randomise)
+        play_album = pick_search_result(psub, 'album', 'Start typing to search for an Album')
     else:
         play_album = next((alb for alb in results if alb.get('name') == chosen_album), None)
 
-        if play_album is None:
-            sys.exit(0)
+    if play_album is None:
+        sys.exit(0)
 
-        psub.show_banner(
-            'Playing {}tracks from {} '.format(
-                'randomised ' if randomise else '',
-                play_album.get('name')
-            )
+    psub.show_banner(
+        'Playing {}tracks from {} '.format(
+            'randomised ' if randomise else '',
+            play_album.get('name')
         )
-        psub.play_album(play_album.get('id'), randomise)
+    )
+    psub.play_album(play_album.get('id'), randomise)
 
 
 @cli.command(help='Play a chosen playlist')
@@ -829,3 +1548,56 @@ def playlist(psub, randomise):
     )
 
     psub.play_playlist(play_list.get('id'), randomise)
+
+
+@cli.command(help='Run pSub as a daemon, controlled with "pSub ctl"')
+@pass_pSub
+def daemon(psub):
+    from control import Daemon
+
+    psub.show_banner('pSub daemon listening for commands')
+    Daemon(psub).serve()
+
+
+@cli.command(help='Send a command to a running pSub daemon')
+@click.argument(
+    'command',
+    type=click.Choice(['play', 'enqueue', 'next', 'restart', 'stop', 'status', 'shutdown'])
+)
+@click.argument('kind', required=False, type=click.Choice(['artist', 'album', 'playlist', 'random']))
+@click.argument('search_term', required=False)
+@click.option(
+    '--randomise',
+    '-r',
+    is_flag=True,
+    help='Randomise the order of track playback',
+)
+def ctl(command, kind, search_term, randomise):
+    from control import send_command
+
+    if command in ['play', 'enqueue'] and kind is None:
+        raise UsageError('{} needs to know what to play. e.g. "pSub ctl {} album <search term>"'.format(command, command))
+
+    try:
+        response = send_command(
+            {'command': command, 'kind': kind, 'search_term': search_term, 'randomise': randomise}
+        )
+    except OSError:
+        click.secho('pSub daemon is not running. Start it with "pSub daemon"', fg='red')
+        sys.exit(1)
+
+    if response.get('status') != 'ok':
+        click.secho(response.get('message', 'Command Failed!'), fg='red')
+        sys.exit(1)
+
+    if response.get('message'):
+        click.secho(response.get('message'), fg='green')
+
+    if command == 'status':
+        playing = response.get('playing')
+        click.secho(
+            'Playing {} by {}'.format(playing.get('title', ''), playing.get('artist', ''))
+            if playing else 'Not playing',
+            fg='green'
+        )
+        click.secho('{} tracks queued'.format(response.get('queued', 0)), fg='blue')
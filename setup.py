@@ -3,7 +3,7 @@ from setuptools import setup
 setup(
     name='pSub',
     version='0.1',
-    py_modules=['pSub'],
+    py_modules=['pSub', 'control', 'async_client'],
     install_requires=[
         'click',
         'colorama',
@@ -14,6 +14,9 @@ setup(
         "pygobject",
         "pycairo"
     ],
+    extras_require={
+        'async': ['aiohttp'],
+    },
     entry_points='''
         [console_scripts]
         pSub=pSub:cli